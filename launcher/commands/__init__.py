@@ -0,0 +1 @@
+"""launcher subcommands."""
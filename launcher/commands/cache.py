@@ -0,0 +1,36 @@
+import logging
+from pathlib import Path
+
+import click
+
+from launcher.config import get_cache_directory
+from launcher.git import warm_reference_repository
+
+logger = logging.getLogger(__name__)
+
+
+@click.group()
+def cache() -> None:
+    """Manage launcher caches."""
+
+
+@cache.command()
+@click.argument("repo")
+@click.option(
+    "--repo-reference",
+    envvar="NOTEBOOK_REPOSITORY_REFERENCE",
+    help=(
+        "local bare repository to fetch into, defaults to "
+        "<cache>/mirror.git (env: NOTEBOOK_REPOSITORY_REFERENCE)"
+    ),
+)
+def warm(repo: str, repo_reference: str | None) -> None:
+    """Fetch a repository into the reference repository used for clones."""
+    reference = (
+        Path(repo_reference) if repo_reference else get_cache_directory() / "mirror.git"
+    )
+    warm_reference_repository(reference, repo)
+    logger.info(
+        "Reference repository ready, set NOTEBOOK_REPOSITORY_REFERENCE=%s to use it",
+        reference,
+    )
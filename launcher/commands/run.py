@@ -0,0 +1,770 @@
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tomllib
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Literal
+
+import click
+
+from launcher.config import get_cache_directory
+from launcher.git import run_git_command
+
+logger = logging.getLogger(__name__)
+
+_MODE_CHOICE = click.Choice(("run", "edit"))
+_DEFAULT_NOTEBOOK = "notebook.py"
+
+# directory listings read via os.scandir, keyed by absolute directory path; cleared
+# by each resolve_notebook_directory call, so listings only live for one launch
+_DIRECTORY_ENTRIES: dict[str, dict[str, os.DirEntry[str]]] = {}
+
+# .in-use lock files of cached clones, kept open (and locked) for the life of the
+# process, and of the notebook server it execs into
+_CLAIMED_CLONES: list[IO[str]] = []
+
+# PEP 723 reference regular expression for inline script metadata blocks
+INLINE_METADATA_REGEX = re.compile(
+    r"(?m)^# /// (?P<type>[a-zA-Z0-9-]+)$\s(?P<content>(^#(| .*)$\s)+)^# ///$"
+)
+
+
+_RUN_PARAMS: list[click.Parameter] = [
+    click.Option(
+        ("--mount",),
+        envvar="NOTEBOOK_MOUNT",
+        help="path to mounted / existing notebook directory (env: NOTEBOOK_MOUNT)",
+    ),
+    click.Option(
+        ("--repo",),
+        envvar="NOTEBOOK_REPOSITORY",
+        help="git repository URL containing the notebook (env: NOTEBOOK_REPOSITORY)",
+    ),
+    click.Option(
+        ("--repo-branch",),
+        envvar="NOTEBOOK_REPOSITORY_BRANCH",
+        help=(
+            "optional branch to checkout from cloned notebook repository "
+            "(env: NOTEBOOK_REPOSITORY_BRANCH)"
+        ),
+    ),
+    click.Option(
+        ("--full-clone",),
+        envvar="NOTEBOOK_FULL_CLONE",
+        is_flag=True,
+        help=(
+            "clone the full history of the notebook repository instead of a shallow, "
+            "single branch clone (env: NOTEBOOK_FULL_CLONE)"
+        ),
+    ),
+    click.Option(
+        ("--repo-reference",),
+        envvar="NOTEBOOK_REPOSITORY_REFERENCE",
+        help=(
+            "optional local bare repository, e.g. populated by 'cache warm', to borrow "
+            "objects from when cloning (env: NOTEBOOK_REPOSITORY_REFERENCE)"
+        ),
+    ),
+    click.Option(
+        ("--path", "notebook_path"),
+        envvar="NOTEBOOK_PATH",
+        help="relative path to the notebook within the directory (env: NOTEBOOK_PATH)",
+        default=_DEFAULT_NOTEBOOK,
+    ),
+    click.Option(
+        ("--requirements", "requirements_file"),
+        envvar="NOTEBOOK_REQUIREMENTS",
+        help="path to requirements file for environment (env: NOTEBOOK_REQUIREMENTS)",
+    ),
+    click.Option(
+        ("--mode",),
+        envvar="NOTEBOOK_MODE",
+        default="run",
+        show_default=True,
+        type=_MODE_CHOICE,
+        help="launch mode, 'run' or 'edit' (env: NOTEBOOK_MODE)",
+    ),
+    click.Option(
+        ("--host",),
+        envvar="NOTEBOOK_HOST",
+        default="0.0.0.0",  # noqa: S104
+        show_default=True,
+        help="host interface to bind (env: NOTEBOOK_HOST)",
+    ),
+    click.Option(
+        ("--port",),
+        envvar="NOTEBOOK_PORT",
+        default=2718,
+        show_default=True,
+        type=int,
+        help="port to bind (env: NOTEBOOK_PORT)",
+    ),
+    click.Option(
+        ("--token",),
+        envvar="NOTEBOOK_TOKEN",
+        default=None,
+        show_default=True,
+        help=(
+            "set a required authentication token/password for the notebook; "
+            "if not set, no token/password is required (env: NOTEBOOK_TOKEN)"
+        ),
+    ),
+    click.Option(
+        ("--base-url",),
+        envvar="NOTEBOOK_BASE_URL",
+        default=None,
+        show_default=True,
+        help=(
+            "explicit base URL prefix to pass through to marimo on notebook launch "
+            "(env: NOTEBOOK_BASE_URL)"
+        ),
+    ),
+    click.Option(
+        ("--exec/--no-exec", "exec_process"),
+        envvar="NOTEBOOK_EXEC",
+        default=True,
+        show_default=True,
+        help=(
+            "replace the launcher process with the notebook server process; with "
+            "--no-exec the server runs as a child process (env: NOTEBOOK_EXEC)"
+        ),
+    ),
+    click.Option(
+        ("--cache-venv",),
+        envvar="NOTEBOOK_CACHE_VENV",
+        is_flag=True,
+        help=(
+            "run the notebook in a virtual environment cached across launches, keyed by "
+            "its requirements file or inline dependencies (env: NOTEBOOK_CACHE_VENV)"
+        ),
+    ),
+]
+
+
+def launch_notebook(
+    *,
+    mount: str | None,
+    repo: str | None,
+    repo_branch: str | None,
+    full_clone: bool,
+    repo_reference: str | None,
+    notebook_path: str,
+    requirements_file: str | None,
+    mode: Literal["run", "edit"],
+    host: str,
+    port: int,
+    token: str | None,
+    base_url: str | None,
+    exec_process: bool,
+    cache_venv: bool,
+) -> None:
+    """Launch notebook in 'run' or 'edit' mode."""
+    requirements_path = Path(requirements_file) if requirements_file else None
+    resolve_directory = functools.partial(
+        resolve_notebook_directory,
+        mount=mount,
+        repo=repo,
+        repo_branch=repo_branch,
+        full_clone=full_clone,
+        repo_reference=Path(repo_reference) if repo_reference else None,
+    )
+
+    python = None
+    if (
+        cache_venv
+        and repo
+        and not mount
+        and requirements_path
+        and requirements_path.is_absolute()
+    ):
+        # requirements file is outside the repository, so the clone and the environment
+        # preparation are independent and their network I/O can overlap
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            directory_future = executor.submit(resolve_directory)
+            python_future = executor.submit(
+                prepare_cached_venv, requirements_path.read_text()
+            )
+            notebook_dir_path = directory_future.result()
+            python = python_future.result()
+    else:
+        notebook_dir_path = resolve_directory()
+
+    full_notebook_path = resolve_notebook_path(notebook_dir_path, notebook_path)
+
+    if cache_venv and not python:
+        python = prepare_notebook_venv(
+            notebook_dir_path, full_notebook_path, requirements_path
+        )
+
+    cmd = prepare_run_command(
+        mode=mode,
+        host=host,
+        port=port,
+        token=token,
+        notebook_path=notebook_path,
+        requirements_file=requirements_path,
+        base_url=base_url,
+        python=python,
+    )
+
+    logger.info("launching notebook '%s' with args %s", full_notebook_path, cmd)
+
+    if not exec_process:
+        result = subprocess.run(cmd, cwd=str(notebook_dir_path), check=True)  # noqa: S603
+        raise sys.exit(result.returncode)
+
+    # overlay this process with uv, leaving no resident launcher process
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.chdir(notebook_dir_path)
+    os.execvp(cmd[0], cmd)  # noqa: S606
+
+
+run = click.Command(
+    "run",
+    callback=launch_notebook,
+    params=_RUN_PARAMS,
+    help=launch_notebook.__doc__,
+)
+
+
+def resolve_notebook_directory(
+    mount: str | None = None,
+    repo: str | None = None,
+    repo_branch: str | None = None,
+    *,
+    full_clone: bool = False,
+    repo_reference: Path | None = None,
+) -> Path:
+    """Determine the root directory that will contain the notebook.
+
+    Resolution rules:
+    1) If "mount" is provided:
+       - Validate that the path is an existing directory and return it.
+    2) Else if "repo" is provided:
+       - Clone repository to a cache directory keyed by repository and branch, or
+         refresh an existing clone there, and return this location.
+    3) Else:
+       - Raise an error because at least one of the two is required.
+
+    Args:
+        - mount: Optional path to an existing host directory to use directly.
+        - repo: Optional git repository URL to clone into a workspace.
+        - repo_branch: Optional git branch to checkout for notebook repository.
+        - full_clone: If True, clone the full repository history.
+        - repo_reference: Optional local bare repository to borrow objects from.
+    """
+    _DIRECTORY_ENTRIES.clear()
+
+    if mount:
+        notebook_dir_path = Path(mount)
+        # listing is cached, so the notebook lookup in this directory is free
+        try:
+            _scan_directory(notebook_dir_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"NOTEBOOK_MOUNT path does not exist: {mount}"
+            ) from None
+        except NotADirectoryError:
+            raise NotADirectoryError(
+                f"NOTEBOOK_MOUNT path is not a directory: {mount}"
+            ) from None
+        except PermissionError:
+            # searchable but not listable (e.g. mode 0711), so fall back to stat
+            if not notebook_dir_path.is_dir():
+                raise FileNotFoundError(
+                    f"NOTEBOOK_MOUNT path does not exist: {mount}"
+                ) from None
+        return notebook_dir_path
+
+    if repo:
+        notebook_dir_path = get_repository_cache_directory(repo, repo_branch)
+
+        clone_notebook_repository(
+            notebook_dir_path,
+            repo,
+            repo_branch,
+            full_clone=full_clone,
+            repo_reference=repo_reference,
+        )
+
+        return notebook_dir_path
+
+    raise ValueError(
+        "either --mount/NOTEBOOK_MOUNT or --repo/NOTEBOOK_REPOSITORY must be provided"
+    )
+
+
+def get_repository_cache_directory(repo: str, repo_branch: str | None = None) -> Path:
+    """Return the deterministic clone directory for a repository and branch.
+
+    Args:
+        - repo: Git repository URL.
+        - repo_branch: Optional git branch, part of the cache key.
+    """
+    key = hashlib.sha256(f"{repo}\n{repo_branch or ''}".encode()).hexdigest()
+    return get_cache_directory() / "clones" / key
+
+
+def clone_notebook_repository(
+    notebook_dir: Path,
+    repo: str,
+    repo_branch: str | None = None,
+    *,
+    full_clone: bool = False,
+    repo_reference: Path | None = None,
+) -> None:
+    """Clone a notebook repository to a target directory.
+
+    Behavior:
+    - If the target directory does not already exist, clone the repository, in-process
+        with pygit2 when available and otherwise with the git CLI.  Unless full_clone is
+        set, this is a shallow clone of only the latest commit.
+    - If an existing reference repository is provided, the git CLI clones with
+        `--reference <repo_reference> --dissociate`, copying objects already present
+        locally instead of downloading them.
+    - If the directory already holds a clone, fetch the latest commit of the branch (or
+        the remote HEAD) and hard reset the checkout to it.  If the refresh fails, e.g.
+        the remote is unreachable, the existing checkout is kept.  A directory without
+        a checked out commit (e.g. left half-written by a killed launch) is removed and
+        cloned again.
+    - Cloning and refreshing hold an exclusive lock on <notebook_dir>.lock, and a clone
+        used by another launch's still running notebook server is not refreshed, so
+        its working tree (e.g. edits saved in edit mode) is not reset underneath it.
+
+    Args:
+        - notebook_dir: Destination directory for the repository checkout.
+        - repo: Git repository URL to clone (e.g., https://..., or SSH URL).
+        - repo_branch: Optional, git branch to checkout during clone
+        - full_clone: If True, clone (or unshallow) the full repository history.
+        - repo_reference: Optional local bare repository to borrow objects from.
+    """
+    # launches of the same repository and branch share the clone directory
+    with _exclusive_lock(notebook_dir.with_name(f"{notebook_dir.name}.lock")):
+        in_use = not _claim_clone(notebook_dir)
+
+        git_cmd = _git_checkout_command(notebook_dir)
+        if _has_checkout(notebook_dir):
+            if in_use:
+                logger.info(
+                    "Cached clone is in use by a running notebook, not refreshing: %s",
+                    notebook_dir,
+                )
+                return
+
+            logger.info("Refreshing cached repository clone: %s", notebook_dir)
+            fetch_cmd = [*git_cmd, "fetch"]
+            if not full_clone:
+                fetch_cmd += ["--depth=1"]
+            elif (notebook_dir / ".git" / "shallow").exists():
+                fetch_cmd += ["--unshallow"]
+            fetch_cmd += ["origin", repo_branch or "HEAD"]
+
+            try:
+                run_git_command(fetch_cmd)
+                run_git_command([*git_cmd, "reset", "--hard", "FETCH_HEAD"])
+            except RuntimeError as exc:
+                logger.warning(
+                    "Refreshing cached clone failed, launching existing checkout: %s", exc
+                )
+            return
+
+        if notebook_dir.exists():
+            logger.info("Removing invalid cached repository clone: %s", notebook_dir)
+            shutil.rmtree(notebook_dir)
+
+        notebook_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        # libgit2 does not support reference repositories
+        use_reference = repo_reference is not None and repo_reference.exists()
+        if not use_reference and clone_with_pygit2(
+            notebook_dir, repo, repo_branch, full_clone=full_clone
+        ):
+            return
+
+        cmd = [
+            "git",
+            "clone",
+        ]
+
+        if not full_clone:
+            cmd += ["--depth=1", "--single-branch", "--filter=blob:none"]
+
+        if repo_branch:
+            cmd += ["--branch", repo_branch]
+
+        if use_reference:
+            cmd += ["--reference", str(repo_reference), "--dissociate"]
+
+        cmd += [repo, str(notebook_dir)]
+        logger.info("Cloning repository with args: %s", cmd)
+
+        run_git_command(cmd)
+
+
+def _claim_clone(notebook_dir: Path) -> bool:
+    """Mark a cached clone as used by this launch, until its notebook server exits.
+
+    Holds a shared flock on <notebook_dir>.in-use through an inheritable file descriptor,
+    so the lock passes to the notebook server when the launcher execs into it.  Returns
+    False if another launch still holds the clone.  Callers must hold the clone's
+    exclusive lock.
+    """
+    try:
+        import fcntl  # noqa: PLC0415
+    except ImportError:
+        return True
+
+    lock_file = notebook_dir.with_name(f"{notebook_dir.name}.in-use").open("w")
+    os.set_inheritable(lock_file.fileno(), True)  # noqa: FBT003
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        claimed = False
+    else:
+        claimed = True
+    fcntl.flock(lock_file, fcntl.LOCK_SH)
+    _CLAIMED_CLONES.append(lock_file)
+    return claimed
+
+
+def _git_checkout_command(notebook_dir: Path) -> list[str]:
+    """Return the git command prefix operating on the clone in notebook_dir.
+
+    Explicit git and work tree directories stop git from searching parent directories
+    for a repository, e.g. when the cache directory is inside another checkout.
+    """
+    return ["git", f"--git-dir={notebook_dir / '.git'}", f"--work-tree={notebook_dir}"]
+
+
+def _has_checkout(notebook_dir: Path) -> bool:
+    """Return True if notebook_dir holds a git clone with a checked out commit."""
+    if not (notebook_dir / ".git").is_dir():
+        return False
+    try:
+        run_git_command(
+            [*_git_checkout_command(notebook_dir), "cat-file", "-e", "HEAD^{commit}"]
+        )
+    except RuntimeError:
+        return False
+    return True
+
+
+def clone_with_pygit2(
+    notebook_dir: Path,
+    repo: str,
+    repo_branch: str | None = None,
+    *,
+    full_clone: bool = False,
+) -> bool:
+    """Clone a notebook repository in-process with pygit2, avoiding a git subprocess.
+
+    Returns False if pygit2 is not installed or the clone fails (e.g. SSH credentials
+    only available to the git CLI), signaling the caller to fall back to the git CLI.
+
+    Args:
+        - notebook_dir: Destination directory for the repository checkout.
+        - repo: Git repository URL to clone.
+        - repo_branch: Optional, git branch to checkout during clone
+        - full_clone: If True, clone the full repository history.
+    """
+    try:
+        import pygit2  # noqa: PLC0415
+    except ImportError:
+        return False
+
+    logger.info("Cloning repository with pygit2: %s", repo)
+    try:
+        pygit2.clone_repository(
+            repo,
+            str(notebook_dir),
+            checkout_branch=repo_branch,
+            depth=0 if full_clone else 1,
+            # auto-detect proxies (e.g. HTTPS_PROXY, http.proxy) like the git CLI does
+            proxy=True,
+        )
+    except pygit2.GitError as exc:
+        logger.warning("pygit2 clone failed, falling back to git CLI: %s", exc)
+        shutil.rmtree(notebook_dir, ignore_errors=True)
+        return False
+
+    return True
+
+
+def resolve_notebook_path(notebook_dir: Path, notebook_path: str) -> Path:
+    """Build and validate the absolute path to the notebook file within notebook_dir.
+
+    Args:
+        - notebook_dir: Base directory that contains the notebook file.
+        - notebook_path: Relative path (or filename) of the notebook within notebook_dir.
+    """
+    full_path = notebook_dir / notebook_path
+    entry = _probe(full_path.parent, full_path.name)
+    if entry is not None:
+        is_file, is_dir = entry.is_file(), entry.is_dir()
+    else:
+        # not an exact name match in the listing, e.g. differently cased on a
+        # case-insensitive filesystem, or the directory is not listable, so fall back
+        # to stat
+        is_file, is_dir = full_path.is_file(), full_path.is_dir()
+
+    if is_file:
+        return full_path
+    if is_dir:
+        raise IsADirectoryError(f"notebook path is not a file: {full_path}")
+    raise FileNotFoundError(f"notebook path not found: {full_path}")
+
+
+def _scan_directory(directory: Path) -> dict[str, os.DirEntry[str]]:
+    """Return entries of a directory, read with a single os.scandir and cached.
+
+    Raises FileNotFoundError or NotADirectoryError if directory is not a directory.
+    """
+    key = str(directory.absolute())
+    if key not in _DIRECTORY_ENTRIES:
+        with os.scandir(directory) as entries:
+            _DIRECTORY_ENTRIES[key] = {entry.name: entry for entry in entries}
+    return _DIRECTORY_ENTRIES[key]
+
+
+def _probe(parent: Path, name: str) -> os.DirEntry[str] | None:
+    """Return the directory entry for name in parent.
+
+    Returns None if either is missing, or parent cannot be listed.
+    """
+    try:
+        return _scan_directory(parent).get(name)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None
+
+
+def read_inline_script_metadata(notebook_path: Path) -> dict[str, Any] | None:
+    """Parse the PEP 723 inline script metadata ("# /// script" block) of a notebook.
+
+    Returns None if the notebook does not have a script metadata block.
+
+    Args:
+        - notebook_path: Path to the marimo notebook file.
+    """
+    for match in INLINE_METADATA_REGEX.finditer(notebook_path.read_text()):
+        if match.group("type") == "script":
+            content = "".join(
+                line[2:] if line.startswith("# ") else line[1:]
+                for line in match.group("content").splitlines(keepends=True)
+            )
+            return tomllib.loads(content)
+    return None
+
+
+def load_inline_script_metadata(notebook_path: Path) -> dict[str, Any] | None:
+    """Return the inline script metadata of a notebook, cached by file identity.
+
+    Parsed metadata is cached as JSON in <cache>/inline-deps/<sha256 of device, inode,
+    mtime, and size>.json, so an unchanged notebook is not re-read and re-parsed.
+
+    Args:
+        - notebook_path: Path to the marimo notebook file.
+    """
+    stat = notebook_path.stat()
+    key = hashlib.sha256(
+        f"{stat.st_dev}:{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}".encode()
+    ).hexdigest()
+    cache_path = get_cache_directory() / "inline-deps" / f"{key}.json"
+
+    if cache_path.exists():
+        return json.loads(cache_path.read_text())
+
+    metadata = read_inline_script_metadata(notebook_path)
+
+    # write then rename, so concurrent launches never read a partial file
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(metadata, default=str))
+    temp_path.replace(cache_path)
+
+    return metadata
+
+
+def prepare_notebook_venv(
+    notebook_dir: Path,
+    notebook_path: Path,
+    requirements_file: Path | None,
+) -> Path | None:
+    """Prepare a cached virtual environment with the dependencies of a notebook.
+
+    Dependencies are read from the requirements file, if provided, else from the
+    notebook's inline script metadata.  Returns the Python interpreter of the cached
+    environment, or None if the notebook does not declare inline dependencies.
+
+    Args:
+        - notebook_dir: Root directory of the notebook, requirements_file is relative to
+            this directory.
+        - notebook_path: Path to the marimo notebook file.
+        - requirements_file: Optional path to a requirements file.
+    """
+    if requirements_file:
+        return prepare_cached_venv((notebook_dir / requirements_file).read_text())
+
+    metadata = load_inline_script_metadata(notebook_path)
+    if metadata is None:
+        return None
+    return prepare_cached_venv(
+        "".join(f"{dependency}\n" for dependency in metadata.get("dependencies", [])),
+        metadata.get("requires-python"),
+    )
+
+
+def prepare_cached_venv(requirements: str, python_version: str | None = None) -> Path:
+    """Create, or reuse, a virtual environment with the given requirements installed.
+
+    Environments live in <cache>/venvs/<sha256 of requirements and python version> and
+    are only reused once fully installed, so a failed install is retried on the next
+    launch.  Building holds an exclusive lock on <cache>/venvs/<sha256>.lock, so
+    concurrent launches sharing a cache do not remove each other's half-built
+    environment.  marimo is always installed alongside the requirements.
+
+    Args:
+        - requirements: Contents of a requirements file.
+        - python_version: Optional Python version request for `uv venv`, e.g. ">=3.13".
+    """
+    key = hashlib.sha256(f"{python_version or ''}\n{requirements}".encode()).hexdigest()
+    venvs_dir = get_cache_directory() / "venvs"
+    venv_dir = venvs_dir / key
+    python = venv_dir / "bin" / "python"
+    installed_marker = venv_dir / ".installed"
+
+    if installed_marker.exists():
+        logger.info("Reusing cached virtual environment: %s", venv_dir)
+        return python
+
+    # venvs hard-code their absolute path, so instead of building elsewhere and
+    # renaming into place, concurrent launches serialize on a lock per environment
+    with _exclusive_lock(venvs_dir / f"{key}.lock"):
+        if installed_marker.exists():
+            logger.info("Reusing cached virtual environment: %s", venv_dir)
+            return python
+
+        logger.info("Creating cached virtual environment: %s", venv_dir)
+        shutil.rmtree(venv_dir, ignore_errors=True)
+        venv_dir.mkdir(parents=True)
+
+        env = os.environ.copy()
+        env.setdefault("UV_CACHE_DIR", str(get_cache_directory() / "uv"))
+
+        venv_cmd = ["uv", "venv"]
+        if python_version:
+            venv_cmd += ["--python", python_version]
+        venv_cmd += [str(venv_dir)]
+        subprocess.run(venv_cmd, check=True, env=env)  # noqa: S603
+
+        requirements_path = venv_dir / "requirements.txt"
+        requirements_path.write_text(requirements)
+        install_cmd = [
+            "uv",
+            "pip",
+            "install",
+            "--python",
+            str(python),
+            "-r",
+            str(requirements_path),
+            "marimo",
+        ]
+        subprocess.run(install_cmd, check=True, env=env)  # noqa: S603
+
+        installed_marker.touch()
+
+    return python
+
+
+@contextlib.contextmanager
+def _exclusive_lock(lock_path: Path) -> Iterator[None]:
+    """Hold an exclusive flock on lock_path, created if missing, for the with block.
+
+    fcntl is only available on POSIX platforms; elsewhere no lock is taken.
+    """
+    try:
+        import fcntl  # noqa: PLC0415
+    except ImportError:
+        yield
+        return
+
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def prepare_run_command(
+    *,
+    mode: str,
+    host: str,
+    port: int,
+    token: str | None,
+    notebook_path: str,
+    requirements_file: Path | None,
+    base_url: str | None = None,
+    python: Path | None = None,
+) -> list[str]:
+    """Build the shell command used to launch a marimo notebook via `uv run`.
+
+    The command has the following general shape:
+      uv run [--no-project --python <python> | --with-requirements <file>] marimo <mode>
+        --host <host> --port <port> [--sandbox] [--no-token] <notebook_path>
+
+    Behavior:
+    - If a Python interpreter is provided, `uv run` uses its (cached) environment which
+        already has the notebook dependencies installed.
+    - Else if a requirements file is provided, `uv run --with-requirements <file>` is
+        used so the notebook runs with those pinned dependencies.
+    - Else `--sandbox` is added to marimo to avoid mutating the user's environment.
+    - `--no-token` disables marimo's auth token if requested.
+    - The final positional argument is the path to the notebook to run.
+
+    Args:
+        - mode: marimo subcommand to run (e.g., "run", "edit").
+        - host: interface to bind the marimo server to (e.g., "127.0.0.1", "0.0.0.0").
+        - port: TCP port for the marimo server.
+        - token: if not None, set as token for notebook, else launch with --no-token
+        - notebook_path: path to the marimo notebook file.
+        - requirements_file: optional path to a requirements file for `uv` (enables
+            `--with-requirements`).
+        - base_url: base URL path launched notebook will listen on
+            e.g. host:port/<base_url>
+        - python: optional Python interpreter of a prepared environment to run in
+    """
+    # if a prepared environment is provided, run in it as-is; else if a requirements
+    # file is provided, ensure uv uses it for dependency resolution
+    environment_args: tuple[str, ...] = ()
+    if python:
+        environment_args = ("--no-project", "--python", str(python))
+    elif requirements_file:
+        environment_args = ("--with-requirements", str(requirements_file))
+
+    # build in a single list display, `uv run` so marimo executes in a managed Python
+    # environment and the notebook path as the final positional argument
+    return [
+        "uv",
+        "run",
+        *environment_args,
+        "marimo",
+        mode,
+        "--headless",
+        "--host",
+        host,
+        "--port",
+        str(port),
+        # without a dedicated environment, prefer an isolated/sandboxed environment
+        *(() if environment_args else ("--sandbox",)),
+        *(("--token", "--token-password", token) if token else ("--no-token",)),
+        *(("--base-url", base_url) if base_url else ()),
+        str(notebook_path),
+    ]
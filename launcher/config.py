@@ -1,7 +1,6 @@
 import logging
 import os
-
-import sentry_sdk
+from pathlib import Path
 
 
 def configure_logger(logger: logging.Logger, *, verbose: bool) -> str:
@@ -28,6 +27,18 @@ def configure_sentry() -> str:
     env = os.getenv("WORKSPACE")
     sentry_dsn = os.getenv("SENTRY_DSN")
     if sentry_dsn and sentry_dsn.lower() != "none":
+        # deferred so launches without Sentry never pay for importing sentry_sdk
+        import sentry_sdk  # noqa: PLC0415
+
         sentry_sdk.init(sentry_dsn, environment=env)
         return f"Sentry DSN found, exceptions will be sent to Sentry with env={env}"
     return "No Sentry DSN found, exceptions will not be sent to Sentry"
+
+
+def get_cache_directory() -> Path:
+    return Path(
+        os.getenv(
+            "MARIMO_LAUNCHER_CACHE",
+            str(Path.home() / ".cache" / "marimo-launcher"),
+        )
+    )
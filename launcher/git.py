@@ -0,0 +1,66 @@
+import hashlib
+import logging
+import os
+import subprocess
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def run_git_command(cmd: list[str]) -> None:
+    """Run a git command, raising an error if it exits with a non-zero code.
+
+    Args:
+        - cmd: Full git command, including the leading "git".
+    """
+    returncode = _run_process(cmd)
+
+    if returncode != 0:
+        raise RuntimeError(f"'{' '.join(cmd)}' failed with code {returncode}")
+
+
+def _run_process(cmd: list[str]) -> int:
+    """Run a command to completion and return its exit code.
+
+    On POSIX platforms the command is started with posix_spawnp, which skips the pipe
+    and fork bookkeeping of subprocess; elsewhere it falls back to subprocess.
+    """
+    if hasattr(os, "posix_spawnp"):
+        pid = os.posix_spawnp(cmd[0], cmd, os.environ)
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status)
+    return subprocess.run(cmd, check=False).returncode  # noqa: S603
+
+
+def warm_reference_repository(reference: Path, repo: str) -> None:
+    """Fetch all branches and tags of a repository into a local bare repository.
+
+    The bare repository can then be passed to `git clone --reference` so clones of this
+    repository, or of forks sharing its history, copy objects locally instead of
+    downloading them.  Refs of each repository are namespaced under
+    refs/mirrors/<sha256 of repository URL> so one reference repository can hold
+    multiple repositories.
+
+    Args:
+        - reference: Path of the bare reference repository, created if missing.
+        - repo: Git repository URL to fetch.
+    """
+    if not reference.exists():
+        reference.parent.mkdir(parents=True, exist_ok=True)
+        run_git_command(["git", "init", "--bare", str(reference)])
+
+    namespace = f"refs/mirrors/{hashlib.sha256(repo.encode()).hexdigest()}"
+    cmd = [
+        "git",
+        "-C",
+        str(reference),
+        "fetch",
+        "--no-tags",
+        "--prune",
+        repo,
+        f"+refs/heads/*:{namespace}/heads/*",
+        f"+refs/tags/*:{namespace}/tags/*",
+    ]
+    logger.info("Warming reference repository with args: %s", cmd)
+
+    run_git_command(cmd)
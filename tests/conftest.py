@@ -1,29 +1,74 @@
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
 import pytest
 from click.testing import CliRunner
 
-import launcher.cli as cli_module
+import launcher.commands.run as run_module
 
 
 @pytest.fixture(autouse=True)
-def _test_env(monkeypatch):
+def _test_env(monkeypatch, tmp_path):
     monkeypatch.setenv("SENTRY_DSN", "None")
     monkeypatch.setenv("WORKSPACE", "test")
+    monkeypatch.setenv("MARIMO_LAUNCHER_CACHE", str(tmp_path / "cache"))
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def _release_claimed_clones():
+    yield
+    for lock_file in run_module._CLAIMED_CLONES:  # noqa: SLF001
+        lock_file.close()
+    run_module._CLAIMED_CLONES.clear()  # noqa: SLF001
+
+
+@pytest.fixture(scope="session")
 def runner():
+    # invoke() isolates streams and env per call, so one runner can be shared
     return CliRunner()
 
 
+@pytest.fixture(scope="session")
+def inline_deps_mount():
+    """Absolute, already resolved path of the inline dependencies notebook fixture."""
+    return str((Path(__file__).parent / "fixtures" / "inline_deps").resolve())
+
+
+@pytest.fixture
+def mocked_subprocess_run(monkeypatch):
+    """Simulate a notebook process that runs and exits successfully."""
+    mocked_run = MagicMock(
+        return_value=subprocess.CompletedProcess(args=[], returncode=0)
+    )
+    monkeypatch.setattr(run_module.subprocess, "run", mocked_run)
+    return mocked_run
+
+
+@pytest.fixture
+def mocked_run_process(monkeypatch):
+    """Simulate git commands that exit successfully."""
+    mocked_run = MagicMock(return_value=0)
+    monkeypatch.setattr("launcher.git._run_process", mocked_run)
+    return mocked_run
+
+
 @pytest.fixture
 def mocked_git_clone(monkeypatch):
     """Simulate a successful git clone by creating the target directory."""
     created: list[str] = []
 
-    def _fake_clone(target, repo: str, branch: str | None = None):
+    def _fake_clone(target, repo: str, branch: str | None = None, **_kwargs):
         target.mkdir(parents=True, exist_ok=True)
         created.append(str(target))
 
-    monkeypatch.setattr(cli_module, "clone_notebook_repository", _fake_clone)
+    monkeypatch.setattr(run_module, "clone_notebook_repository", _fake_clone)
 
     return created
+
+
+@pytest.fixture
+def pygit2_unavailable(monkeypatch):
+    """Force the git CLI clone path by making pygit2 unimportable."""
+    monkeypatch.setitem(sys.modules, "pygit2", None)
@@ -1,178 +1,175 @@
-# ruff: noqa: FBT001, S104
+# ruff: noqa: S104
 
-import subprocess
+import threading
 from pathlib import Path
-from unittest import mock
+from unittest.mock import MagicMock
 
+import click
 import pytest
 
-from launcher.cli import (
-    cli,
-    prepare_run_command,
-    resolve_notebook_directory,
-    resolve_notebook_path,
+from launcher.cli import LazyGroup, cli
+from launcher.commands.run import run
+
+_EXPECTED_PREFIX = (
+    "uv",
+    "run",
+    "marimo",
+    "run",
+    "--headless",
+    "--host",
+    "0.0.0.0",
+    "--port",
+    "2718",
+    "--sandbox",
+    "--no-token",
 )
 
 
-def test_resolve_notebook_directory_mount(tmp_path: Path) -> None:
-    notebook_dir = tmp_path / "nb"
-    notebook_dir.mkdir()
-    resolved_notebook_dir = resolve_notebook_directory(mount=str(notebook_dir))
-    assert resolved_notebook_dir == notebook_dir
-
-
-def test_resolve_notebook_directory_missing_mount(tmp_path: Path) -> None:
-    missing = tmp_path / "does-not-exist"
-    with pytest.raises(FileNotFoundError):
-        resolve_notebook_directory(mount=str(missing))
-
-
-def test_resolve_notebook_directory_repo_creates_dir_via_git_clone(
-    tmp_path: Path, mocked_git_clone
-) -> None:
-    notebook_dir = resolve_notebook_directory(
-        mount=None, repo="https://example.com/x.git", repo_branch="main"
-    )
-
-    assert notebook_dir.is_dir()
-    assert Path(mocked_git_clone[0]) == notebook_dir
+def test_cli_no_commands(caplog, runner):
+    result = runner.invoke(cli, [])
+    assert result.exit_code == 2
 
 
-def test_resolve_notebook_path_exists(tmp_path: Path) -> None:
-    notebook_file = tmp_path / "notebook.py"
-    notebook_file.write_text("print('hi')\n")
-    resolved_path = resolve_notebook_path(tmp_path, "notebook.py")
-    assert resolved_path == notebook_file
+def test_cli_lazy_subcommand_resolves_command():
+    ctx = click.Context(cli)
+    assert cli.list_commands(ctx) == ["cache", "run"]
+    assert cli.get_command(ctx, "run") is run
 
 
-def test_resolve_notebook_path_missing(tmp_path: Path) -> None:
-    with pytest.raises(FileNotFoundError):
-        resolve_notebook_path(tmp_path, "missing.py")
+def test_cli_lazy_subcommand_non_command_error():
+    group = LazyGroup(lazy_subcommands={"bad": "launcher.commands.run:logger"})
+    with pytest.raises(TypeError, match="did not resolve to a click"):
+        group.get_command(click.Context(group), "bad")
 
 
 @pytest.mark.parametrize(
-    ("has_requirements", "token"),
+    ("extra_args", "expected_tail"),
     [
-        (False, None),
-        (False, "secret-token"),
-        (True, None),
-        (True, "secret-token"),
+        ([], ["notebook.py"]),
+        (
+            ["--base-url", "/my/super/path.py"],
+            ["--base-url", "/my/super/path.py", "notebook.py"],
+        ),
     ],
+    ids=["defaults", "base_url_override"],
 )
-@pytest.mark.parametrize("mode", ["run", "edit"])
-def test_prepare_run_command_variants(
-    tmp_path: Path,
-    has_requirements: bool,
-    token: str | None,
-    mode: str,
-) -> None:
-    requirements = tmp_path / "requirements.txt"
-    if has_requirements:
-        requirements.write_text("marimo==0.14.17\n")
-        requirements_path: Path | None = requirements
-    else:
-        requirements_path = None
-
-    command = prepare_run_command(
-        mode=mode,
-        host="127.0.0.1",
-        port=8888,
-        token=token,
-        notebook_path="notebook.py",
-        requirements_file=requirements_path,
-    )
-
-    # must start with uv run
-    assert command[:2] == ["uv", "run"]
-
-    # requirements handling
-    if has_requirements:
-        assert "--with-requirements" in command
-        assert str(requirements) in command
-        assert "--sandbox" not in command
-    else:
-        assert "--sandbox" in command
-        assert "--with-requirements" not in command
+def test_cli_subprocess_run_command(
+    runner, mocked_subprocess_run, inline_deps_mount, extra_args, expected_tail
+):
+    """Mock subprocess.run to simulate valid notebook run and exit."""
+    args = ["run", "--mount", inline_deps_mount, "--no-exec", *extra_args]
 
-    # token handling
-    if token:
-        assert ["--token", "--token-password", token] == command[-4:-1]
-    else:
-        assert "--no-token" in command
+    _result = runner.invoke(cli, args)
 
-    # notebook path is last
-    assert command[-1] == "notebook.py"
+    # assert subproces.run has correct working directory of notebook
+    assert mocked_subprocess_run.call_args.kwargs.get("cwd") == inline_deps_mount
 
+    # assert subprocess.run had defaults applied
+    command = mocked_subprocess_run.call_args.args[0]
+    assert tuple(command[: len(_EXPECTED_PREFIX)]) == _EXPECTED_PREFIX
+    assert command[len(_EXPECTED_PREFIX) :] == expected_tail
 
-def test_cli_no_commands(caplog, runner):
-    result = runner.invoke(cli, [])
-    assert result.exit_code == 2
 
+def test_cli_exec_replaces_process_in_notebook_directory(
+    runner, mocked_subprocess_run, inline_deps_mount, monkeypatch
+):
+    args = ["run", "--mount", inline_deps_mount]
+    mock_chdir = MagicMock()
+    mock_execvp = MagicMock()
+    monkeypatch.setattr("launcher.commands.run.os.chdir", mock_chdir)
+    monkeypatch.setattr("launcher.commands.run.os.execvp", mock_execvp)
 
-def test_cli_subprocess_run_minimal_required_args_get_defaults_success(runner):
-    """Mock subprocess.run to simulate valid notebook run and exit."""
-    args = ["run", "--mount", "tests/fixtures/inline_deps"]
+    result = runner.invoke(cli, args)
 
-    with mock.patch("launcher.cli.subprocess.run") as mock_subprocess_run:
-        mock_subprocess_run.return_value = subprocess.CompletedProcess(
-            args=args, returncode=0
-        )
-        _result = runner.invoke(cli, args)
+    assert result.exit_code == 0
+    mock_chdir.assert_called_once_with(Path(inline_deps_mount))
+    mock_execvp.assert_called_once()
+    assert mock_execvp.call_args.args[0] == "uv"
+    command = mock_execvp.call_args.args[1]
+    assert tuple(command[: len(_EXPECTED_PREFIX)]) == _EXPECTED_PREFIX
+    assert command[len(_EXPECTED_PREFIX) :] == ["notebook.py"]
+    mocked_subprocess_run.assert_not_called()
+
+
+def test_cli_subprocess_run_cache_venv(
+    runner, mocked_subprocess_run, inline_deps_mount, monkeypatch
+):
+    args = ["run", "--mount", inline_deps_mount, "--cache-venv", "--no-exec"]
+    monkeypatch.setattr(
+        "launcher.commands.run.prepare_cached_venv",
+        MagicMock(return_value=Path("/cache/venvs/abc/bin/python")),
+    )
 
-    # assert subproces.run has correct working directory of notebook
-    assert mock_subprocess_run.call_args.kwargs.get("cwd") == "tests/fixtures/inline_deps"
+    _result = runner.invoke(cli, args)
 
-    # assert subprocess.run had defaults applied
-    assert mock_subprocess_run.call_args.args[0] == [
+    assert mocked_subprocess_run.call_args.args[0][:5] == [
         "uv",
         "run",
-        "marimo",
-        "run",
-        "--headless",
-        "--host",
-        "0.0.0.0",
-        "--port",
-        "2718",
-        "--sandbox",
-        "--no-token",
-        "notebook.py",
+        "--no-project",
+        "--python",
+        "/cache/venvs/abc/bin/python",
     ]
+    assert "--sandbox" not in mocked_subprocess_run.call_args.args[0]
+
+
+def test_cli_cache_warm_default_reference(runner, tmp_path, monkeypatch):
+    mock_warm_reference_repository = MagicMock()
+    monkeypatch.setattr(
+        "launcher.commands.cache.warm_reference_repository",
+        mock_warm_reference_repository,
+    )
+
+    result = runner.invoke(cli, ["cache", "warm", "https://example.com/x.git"])
+
+    assert result.exit_code == 0
+    mock_warm_reference_repository.assert_called_once_with(
+        tmp_path / "cache" / "mirror.git", "https://example.com/x.git"
+    )
+
+
+def test_cli_subprocess_run_clones_and_prepares_venv_concurrently(
+    runner, mocked_subprocess_run, tmp_path, monkeypatch
+):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("tinydb\n")
+    # both steps must be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def _fake_clone(target, *_args, **_kwargs):
+        barrier.wait()
+        target.mkdir(parents=True)
+        (target / "notebook.py").touch()
 
+    def _fake_prepare_cached_venv(_requirements):
+        barrier.wait()
+        return Path("/cache/venvs/abc/bin/python")
 
-def test_cli_subprocess_run_base_url_override(runner):
     args = [
         "run",
-        "--mount",
-        "tests/fixtures/inline_deps",
-        "--base-url",
-        "/my/super/path.py",
+        "--repo",
+        "https://example.com/x.git",
+        "--requirements",
+        str(requirements),
+        "--cache-venv",
+        "--no-exec",
     ]
 
-    with mock.patch("launcher.cli.subprocess.run") as mock_subprocess_run:
-        mock_subprocess_run.return_value = subprocess.CompletedProcess(
-            args=args, returncode=0
-        )
-        _result = runner.invoke(cli, args)
+    mock_prepare_cached_venv = MagicMock(side_effect=_fake_prepare_cached_venv)
+    monkeypatch.setattr("launcher.commands.run.clone_notebook_repository", _fake_clone)
+    monkeypatch.setattr(
+        "launcher.commands.run.prepare_cached_venv", mock_prepare_cached_venv
+    )
 
-    # assert subproces.run has correct working directory of notebook
-    assert mock_subprocess_run.call_args.kwargs.get("cwd") == "tests/fixtures/inline_deps"
+    result = runner.invoke(cli, args)
 
-    # assert subprocess.run had defaults applied
-    assert mock_subprocess_run.call_args.args[0] == [
+    assert result.exit_code == 0
+    mock_prepare_cached_venv.assert_called_once_with("tinydb\n")
+    assert mocked_subprocess_run.call_args.args[0][:5] == [
         "uv",
         "run",
-        "marimo",
-        "run",
-        "--headless",
-        "--host",
-        "0.0.0.0",
-        "--port",
-        "2718",
-        "--sandbox",
-        "--no-token",
-        "--base-url",
-        "/my/super/path.py",
-        "notebook.py",
+        "--no-project",
+        "--python",
+        "/cache/venvs/abc/bin/python",
     ]
 
 
@@ -188,13 +185,13 @@ def test_cli_subprocess_run_missing_mount_or_repo_args_error(runner):
     )
 
 
-def test_cli_subprocess_run_bad_notebook_path_error(runner):
-    args = ["run", "--mount", "tests/fixtures/inline_deps", "--path", "bad-notebook.py"]
+def test_cli_subprocess_run_bad_notebook_path_error(runner, inline_deps_mount):
+    args = ["run", "--mount", inline_deps_mount, "--path", "bad-notebook.py"]
 
     result = runner.invoke(cli, args)
 
     assert result.exit_code == 1
     assert (
         str(result.exception)
-        == "notebook path not found: tests/fixtures/inline_deps/bad-notebook.py"
+        == f"notebook path not found: {inline_deps_mount}/bad-notebook.py"
     )
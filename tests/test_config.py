@@ -1,6 +1,8 @@
 import logging
+import sys
+from pathlib import Path
 
-from launcher.config import configure_logger, configure_sentry
+from launcher.config import configure_logger, configure_sentry, get_cache_directory
 
 
 def test_configure_logger_not_verbose():
@@ -31,7 +33,23 @@ def test_configure_sentry_env_variable_is_none(monkeypatch):
     assert result == "No Sentry DSN found, exceptions will not be sent to Sentry"
 
 
+def test_configure_sentry_no_dsn_skips_sentry_sdk_import(monkeypatch):
+    monkeypatch.delitem(sys.modules, "sentry_sdk", raising=False)
+    configure_sentry()
+    assert "sentry_sdk" not in sys.modules
+
+
 def test_configure_sentry_env_variable_is_dsn(monkeypatch):
     monkeypatch.setenv("SENTRY_DSN", "https://1234567890@00000.ingest.sentry.io/123456")
     result = configure_sentry()
     assert result == "Sentry DSN found, exceptions will be sent to Sentry with env=test"
+
+
+def test_get_cache_directory_env_variable(monkeypatch):
+    monkeypatch.setenv("MARIMO_LAUNCHER_CACHE", "/srv/launcher-cache")
+    assert get_cache_directory() == Path("/srv/launcher-cache")
+
+
+def test_get_cache_directory_default(monkeypatch):
+    monkeypatch.delenv("MARIMO_LAUNCHER_CACHE")
+    assert get_cache_directory() == Path.home() / ".cache" / "marimo-launcher"
@@ -0,0 +1,72 @@
+import os
+import subprocess
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from launcher.git import run_git_command, warm_reference_repository
+
+
+def test_run_git_command_non_zero_exit_error(mocked_run_process: MagicMock) -> None:
+    mocked_run_process.return_value = 128
+
+    with pytest.raises(RuntimeError, match="'git fetch' failed with code 128"):
+        run_git_command(["git", "fetch"])
+
+
+def test_run_git_command_spawns_git(tmp_path: Path) -> None:
+    run_git_command(["git", "init", "--bare", str(tmp_path / "repo.git")])
+
+    assert (tmp_path / "repo.git" / "HEAD").exists()
+
+
+def test_run_git_command_spawned_git_non_zero_exit_error(tmp_path: Path) -> None:
+    with pytest.raises(RuntimeError, match="failed with code 128"):
+        run_git_command(["git", "-C", str(tmp_path), "rev-parse", "HEAD"])
+
+
+def test_run_git_command_without_posix_spawn_uses_subprocess(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.delattr(os, "posix_spawnp")
+    mock_subprocess_run = MagicMock(
+        return_value=subprocess.CompletedProcess(args=[], returncode=0)
+    )
+    monkeypatch.setattr("launcher.git.subprocess.run", mock_subprocess_run)
+
+    run_git_command(["git", "fetch"])
+
+    mock_subprocess_run.assert_called_once_with(["git", "fetch"], check=False)
+
+
+def test_warm_reference_repository_creates_and_fetches(
+    tmp_path: Path, mocked_run_process: MagicMock
+) -> None:
+    reference = tmp_path / "cache" / "mirror.git"
+
+    warm_reference_repository(reference, "https://example.com/x.git")
+
+    init_cmd, fetch_cmd = [call.args[0] for call in mocked_run_process.call_args_list]
+    assert init_cmd == ["git", "init", "--bare", str(reference)]
+    assert fetch_cmd[:7] == [
+        "git",
+        "-C",
+        str(reference),
+        "fetch",
+        "--no-tags",
+        "--prune",
+        "https://example.com/x.git",
+    ]
+    assert fetch_cmd[7].startswith("+refs/heads/*:refs/mirrors/")
+    assert fetch_cmd[8].startswith("+refs/tags/*:refs/mirrors/")
+
+
+def test_warm_reference_repository_namespaces_refs_per_repository(
+    tmp_path: Path, mocked_run_process: MagicMock
+) -> None:
+    warm_reference_repository(tmp_path, "https://example.com/x.git")
+    warm_reference_repository(tmp_path, "https://example.com/y.git")
+
+    x_fetch, y_fetch = [call.args[0] for call in mocked_run_process.call_args_list]
+    assert x_fetch[-2] != y_fetch[-2]
@@ -0,0 +1,560 @@
+import fcntl
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pygit2
+import pytest
+
+from launcher.commands.run import (
+    clone_notebook_repository,
+    get_repository_cache_directory,
+    load_inline_script_metadata,
+    prepare_cached_venv,
+    prepare_notebook_venv,
+    prepare_run_command,
+    read_inline_script_metadata,
+    resolve_notebook_directory,
+    resolve_notebook_path,
+)
+
+
+def test_resolve_notebook_directory_mount(tmp_path: Path) -> None:
+    notebook_dir = tmp_path / "nb"
+    notebook_dir.mkdir()
+    resolved_notebook_dir = resolve_notebook_directory(mount=str(notebook_dir))
+    assert resolved_notebook_dir == notebook_dir
+
+
+def test_resolve_notebook_directory_missing_mount(tmp_path: Path) -> None:
+    missing = tmp_path / "does-not-exist"
+    with pytest.raises(FileNotFoundError):
+        resolve_notebook_directory(mount=str(missing))
+
+
+def test_resolve_notebook_directory_mount_not_a_directory(tmp_path: Path) -> None:
+    not_a_directory = tmp_path / "notebook.py"
+    not_a_directory.touch()
+    with pytest.raises(NotADirectoryError):
+        resolve_notebook_directory(mount=str(not_a_directory))
+
+
+def test_resolve_notebook_directory_repo_creates_dir_via_git_clone(
+    tmp_path: Path, mocked_git_clone
+) -> None:
+    notebook_dir = resolve_notebook_directory(
+        mount=None, repo="https://example.com/x.git", repo_branch="main"
+    )
+
+    assert notebook_dir.is_dir()
+    assert Path(mocked_git_clone[0]) == notebook_dir
+    assert notebook_dir.parent == tmp_path / "cache" / "clones"
+
+
+def test_get_repository_cache_directory_keyed_by_repo_and_branch() -> None:
+    repo = "https://example.com/x.git"
+    assert get_repository_cache_directory(repo, "main") == get_repository_cache_directory(
+        repo, "main"
+    )
+    assert get_repository_cache_directory(repo, "main") != get_repository_cache_directory(
+        repo, "dev"
+    )
+    assert get_repository_cache_directory(repo) != get_repository_cache_directory(
+        "https://example.com/y.git"
+    )
+
+
+@pytest.mark.usefixtures("pygit2_unavailable")
+def test_clone_notebook_repository_clones_missing_directory(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+
+    clone_notebook_repository(notebook_dir, "https://example.com/x.git", "main")
+
+    assert notebook_dir.parent.is_dir()
+    assert mocked_run_process.call_args.args[0] == [
+        "git",
+        "clone",
+        "--depth=1",
+        "--single-branch",
+        "--filter=blob:none",
+        "--branch",
+        "main",
+        "https://example.com/x.git",
+        str(notebook_dir),
+    ]
+
+
+@pytest.mark.usefixtures("pygit2_unavailable")
+def test_clone_notebook_repository_full_clone(tmp_path: Path, mocked_run_process) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+
+    clone_notebook_repository(notebook_dir, "https://example.com/x.git", full_clone=True)
+
+    assert mocked_run_process.call_args.args[0] == [
+        "git",
+        "clone",
+        "https://example.com/x.git",
+        str(notebook_dir),
+    ]
+
+
+def test_clone_notebook_repository_uses_pygit2(
+    tmp_path: Path, monkeypatch, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    mock_clone_repository = MagicMock()
+    monkeypatch.setattr(pygit2, "clone_repository", mock_clone_repository)
+
+    clone_notebook_repository(notebook_dir, "https://example.com/x.git", "main")
+
+    mock_clone_repository.assert_called_once_with(
+        "https://example.com/x.git",
+        str(notebook_dir),
+        checkout_branch="main",
+        depth=1,
+        proxy=True,
+    )
+    mocked_run_process.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        pygit2.GitError("auth required"),
+        pygit2.NotFoundError("reference 'refs/remotes/origin/nope' not found"),
+    ],
+)
+def test_clone_notebook_repository_pygit2_error_falls_back_to_git_cli(
+    tmp_path: Path, monkeypatch, mocked_run_process, error
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    monkeypatch.setattr(pygit2, "clone_repository", MagicMock(side_effect=error))
+
+    clone_notebook_repository(notebook_dir, "git@example.com:x.git")
+
+    assert mocked_run_process.call_args.args[0][:2] == ["git", "clone"]
+
+
+def test_clone_notebook_repository_refreshes_existing_directory(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    (tmp_path / ".git").mkdir()
+
+    clone_notebook_repository(tmp_path, "https://example.com/x.git", "main")
+
+    git_cmd = ["git", f"--git-dir={tmp_path / '.git'}", f"--work-tree={tmp_path}"]
+    assert [call.args[0] for call in mocked_run_process.call_args_list] == [
+        [*git_cmd, "cat-file", "-e", "HEAD^{commit}"],
+        [*git_cmd, "fetch", "--depth=1", "origin", "main"],
+        [*git_cmd, "reset", "--hard", "FETCH_HEAD"],
+    ]
+
+
+def test_clone_notebook_repository_full_clone_unshallows_existing_directory(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".git" / "shallow").touch()
+
+    clone_notebook_repository(tmp_path, "https://example.com/x.git", full_clone=True)
+
+    assert mocked_run_process.call_args_list[1].args[0] == [
+        "git",
+        f"--git-dir={tmp_path / '.git'}",
+        f"--work-tree={tmp_path}",
+        "fetch",
+        "--unshallow",
+        "origin",
+        "HEAD",
+    ]
+
+
+@pytest.mark.usefixtures("pygit2_unavailable")
+def test_clone_notebook_repository_recreates_directory_without_git(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    notebook_dir.mkdir(parents=True)
+    (notebook_dir / "leftover.txt").touch()
+
+    clone_notebook_repository(notebook_dir, "https://example.com/x.git")
+
+    assert not (notebook_dir / "leftover.txt").exists()
+    mocked_run_process.assert_called_once()
+    assert mocked_run_process.call_args.args[0][:2] == ["git", "clone"]
+
+
+@pytest.mark.usefixtures("pygit2_unavailable")
+def test_clone_notebook_repository_recreates_directory_without_checkout(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    (notebook_dir / ".git").mkdir(parents=True)
+    # cat-file finds no checked out commit, clone succeeds
+    mocked_run_process.side_effect = [128, 0]
+
+    clone_notebook_repository(notebook_dir, "https://example.com/x.git")
+
+    assert not notebook_dir.exists()
+    assert mocked_run_process.call_args.args[0][:2] == ["git", "clone"]
+
+
+def test_clone_notebook_repository_keeps_checkout_when_fetch_fails(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    (notebook_dir / ".git").mkdir(parents=True)
+    (notebook_dir / "notebook.py").touch()
+    # cat-file finds a checked out commit, fetch fails
+    mocked_run_process.side_effect = [0, 128]
+
+    clone_notebook_repository(notebook_dir, "https://example.com/x.git")
+
+    assert (notebook_dir / "notebook.py").exists()
+    assert mocked_run_process.call_count == 2
+    assert mocked_run_process.call_args.args[0][3] == "fetch"
+
+
+def test_clone_notebook_repository_skips_refresh_of_clone_in_use(
+    tmp_path: Path, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    (notebook_dir / ".git").mkdir(parents=True)
+
+    # notebook server of another launch still uses the clone
+    with (tmp_path / "clones" / "abc.in-use").open("w") as in_use_file:
+        fcntl.flock(in_use_file, fcntl.LOCK_SH)
+        clone_notebook_repository(notebook_dir, "https://example.com/x.git")
+
+    assert [call.args[0][3:] for call in mocked_run_process.call_args_list] == [
+        ["cat-file", "-e", "HEAD^{commit}"]
+    ]
+
+
+@pytest.mark.usefixtures("pygit2_unavailable")
+def test_clone_notebook_repository_waits_for_concurrent_clone(
+    tmp_path: Path, monkeypatch, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    waiting_for_lock = threading.Event()
+    flock = fcntl.flock
+
+    def _flock(fd, operation):
+        waiting_for_lock.set()
+        flock(fd, operation)
+
+    monkeypatch.setattr(fcntl, "flock", _flock)
+
+    # another launch holds the clone lock and finishes the clone
+    notebook_dir.parent.mkdir(parents=True)
+    with (tmp_path / "clones" / "abc.lock").open("w") as lock_file:
+        flock(lock_file, fcntl.LOCK_EX)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                clone_notebook_repository, notebook_dir, "https://example.com/x.git"
+            )
+            assert waiting_for_lock.wait(timeout=5)
+            (notebook_dir / ".git").mkdir(parents=True)
+            flock(lock_file, fcntl.LOCK_UN)
+            future.result(timeout=5)
+
+    assert [call.args[0][3] for call in mocked_run_process.call_args_list] == [
+        "cat-file",
+        "fetch",
+        "reset",
+    ]
+
+
+def test_clone_notebook_repository_with_reference(
+    tmp_path: Path, monkeypatch, mocked_run_process
+) -> None:
+    notebook_dir = tmp_path / "clones" / "abc"
+    reference = tmp_path / "mirror.git"
+    reference.mkdir()
+    mock_clone_repository = MagicMock()
+    monkeypatch.setattr(pygit2, "clone_repository", mock_clone_repository)
+
+    clone_notebook_repository(
+        notebook_dir, "https://example.com/x.git", repo_reference=reference
+    )
+
+    mock_clone_repository.assert_not_called()
+    assert mocked_run_process.call_args.args[0] == [
+        "git",
+        "clone",
+        "--depth=1",
+        "--single-branch",
+        "--filter=blob:none",
+        "--reference",
+        str(reference),
+        "--dissociate",
+        "https://example.com/x.git",
+        str(notebook_dir),
+    ]
+
+
+def test_resolve_notebook_path_exists(tmp_path: Path) -> None:
+    notebook_file = tmp_path / "notebook.py"
+    notebook_file.write_text("print('hi')\n")
+    resolved_path = resolve_notebook_path(tmp_path, "notebook.py")
+    assert resolved_path == notebook_file
+
+
+def test_resolve_notebook_path_reuses_mount_directory_scan(
+    tmp_path: Path, monkeypatch
+) -> None:
+    (tmp_path / "notebook.py").write_text("print('hi')\n")
+    notebook_dir = resolve_notebook_directory(mount=str(tmp_path))
+    mock_scandir = MagicMock()
+    monkeypatch.setattr("launcher.commands.run.os.scandir", mock_scandir)
+
+    resolve_notebook_path(notebook_dir, "notebook.py")
+
+    mock_scandir.assert_not_called()
+
+
+def test_resolve_notebook_path_not_a_file(tmp_path: Path) -> None:
+    (tmp_path / "notebook.py").mkdir()
+    with pytest.raises(IsADirectoryError):
+        resolve_notebook_path(tmp_path, "notebook.py")
+
+
+def test_resolve_notebook_path_missing(tmp_path: Path) -> None:
+    with pytest.raises(FileNotFoundError):
+        resolve_notebook_path(tmp_path, "missing.py")
+
+
+def test_resolve_notebook_path_unlistable_mount(tmp_path: Path, monkeypatch) -> None:
+    (tmp_path / "notebook.py").touch()
+    # a mode 0711 directory can be entered but not listed
+    monkeypatch.setattr(
+        "launcher.commands.run.os.scandir", MagicMock(side_effect=PermissionError)
+    )
+
+    notebook_dir = resolve_notebook_directory(mount=str(tmp_path))
+
+    assert notebook_dir == tmp_path
+    assert resolve_notebook_path(notebook_dir, "notebook.py") == tmp_path / "notebook.py"
+    with pytest.raises(FileNotFoundError):
+        resolve_notebook_path(notebook_dir, "missing.py")
+
+
+def test_resolve_notebook_path_dangling_symlink(tmp_path: Path) -> None:
+    (tmp_path / "notebook.py").symlink_to(tmp_path / "missing.py")
+    with pytest.raises(FileNotFoundError):
+        resolve_notebook_path(tmp_path, "notebook.py")
+
+
+def test_resolve_notebook_path_created_after_directory_scan(tmp_path: Path) -> None:
+    notebook_dir = resolve_notebook_directory(mount=str(tmp_path))
+    (tmp_path / "notebook.py").touch()
+
+    assert resolve_notebook_path(notebook_dir, "notebook.py") == tmp_path / "notebook.py"
+
+
+@pytest.mark.parametrize("token", [None, "secret-token"])
+@pytest.mark.parametrize("mode", ["run", "edit"])
+def test_prepare_run_command_sandbox(token: str | None, mode: str) -> None:
+    command = prepare_run_command(
+        mode=mode,
+        host="127.0.0.1",
+        port=8888,
+        token=token,
+        notebook_path="notebook.py",
+        requirements_file=None,
+    )
+
+    assert command[:5] == ["uv", "run", "marimo", mode, "--headless"]
+    assert "--sandbox" in command
+    assert "--with-requirements" not in command
+    _assert_token_and_notebook_path(command, token)
+
+
+@pytest.mark.parametrize("token", [None, "secret-token"])
+@pytest.mark.parametrize("mode", ["run", "edit"])
+def test_prepare_run_command_with_requirements(token: str | None, mode: str) -> None:
+    # only embedded in the command, so the file does not need to exist
+    requirements = Path("requirements.txt")
+
+    command = prepare_run_command(
+        mode=mode,
+        host="127.0.0.1",
+        port=8888,
+        token=token,
+        notebook_path="notebook.py",
+        requirements_file=requirements,
+    )
+
+    assert command[:4] == ["uv", "run", "--with-requirements", str(requirements)]
+    assert command[4:6] == ["marimo", mode]
+    assert "--sandbox" not in command
+    _assert_token_and_notebook_path(command, token)
+
+
+def _assert_token_and_notebook_path(command: list[str], token: str | None) -> None:
+    if token:
+        assert ["--token", "--token-password", token] == command[-4:-1]
+    else:
+        assert "--no-token" in command
+
+    # notebook path is last
+    assert command[-1] == "notebook.py"
+
+
+def test_prepare_run_command_with_python() -> None:
+    command = prepare_run_command(
+        mode="run",
+        host="127.0.0.1",
+        port=8888,
+        token=None,
+        notebook_path="notebook.py",
+        requirements_file=Path("requirements.txt"),
+        python=Path("/cache/venvs/abc/bin/python"),
+    )
+
+    assert command[:5] == [
+        "uv",
+        "run",
+        "--no-project",
+        "--python",
+        "/cache/venvs/abc/bin/python",
+    ]
+    assert "--with-requirements" not in command
+    assert "--sandbox" not in command
+
+
+def test_read_inline_script_metadata() -> None:
+    metadata = read_inline_script_metadata(Path("tests/fixtures/inline_deps/notebook.py"))
+    assert metadata == {"requires-python": ">=3.13", "dependencies": ["marimo", "tinydb"]}
+
+
+def test_read_inline_script_metadata_missing() -> None:
+    assert (
+        read_inline_script_metadata(
+            Path("tests/fixtures/static_deps_reqs_txt/notebook.py")
+        )
+        is None
+    )
+
+
+def test_load_inline_script_metadata_cached_by_file_identity(
+    tmp_path: Path, monkeypatch
+) -> None:
+    notebook = tmp_path / "notebook.py"
+    notebook.write_text(
+        Path("tests/fixtures/inline_deps/notebook.py").read_text(), encoding="utf-8"
+    )
+    mock_read = MagicMock(wraps=read_inline_script_metadata)
+    monkeypatch.setattr("launcher.commands.run.read_inline_script_metadata", mock_read)
+
+    metadata = load_inline_script_metadata(notebook)
+    assert metadata == {"requires-python": ">=3.13", "dependencies": ["marimo", "tinydb"]}
+    assert len(list((tmp_path / "cache" / "inline-deps").glob("*.json"))) == 1
+    assert load_inline_script_metadata(notebook) == metadata
+    assert mock_read.call_count == 1
+
+    notebook.write_text("import marimo\n")
+    assert load_inline_script_metadata(notebook) is None
+    assert load_inline_script_metadata(notebook) is None
+    assert mock_read.call_count == 2
+
+
+def test_prepare_cached_venv_creates_and_reuses_venv(tmp_path: Path, monkeypatch) -> None:
+    mock_subprocess_run = MagicMock()
+    monkeypatch.setattr("launcher.commands.run.subprocess.run", mock_subprocess_run)
+
+    python = prepare_cached_venv("tinydb\n", ">=3.13")
+
+    venv_dir = python.parent.parent
+    assert venv_dir.parent == tmp_path / "cache" / "venvs"
+    assert (venv_dir / "requirements.txt").read_text() == "tinydb\n"
+    assert [call.args[0] for call in mock_subprocess_run.call_args_list] == [
+        ["uv", "venv", "--python", ">=3.13", str(venv_dir)],
+        [
+            "uv",
+            "pip",
+            "install",
+            "--python",
+            str(python),
+            "-r",
+            str(venv_dir / "requirements.txt"),
+            "marimo",
+        ],
+    ]
+    assert mock_subprocess_run.call_args.kwargs["env"]["UV_CACHE_DIR"] == str(
+        tmp_path / "cache" / "uv"
+    )
+
+    mock_subprocess_run.reset_mock()
+    assert prepare_cached_venv("tinydb\n", ">=3.13") == python
+    mock_subprocess_run.assert_not_called()
+
+
+def test_prepare_cached_venv_waits_for_concurrent_build(
+    tmp_path: Path, monkeypatch
+) -> None:
+    mock_subprocess_run = MagicMock()
+    monkeypatch.setattr("launcher.commands.run.subprocess.run", mock_subprocess_run)
+    python = prepare_cached_venv("tinydb\n")
+    venv_dir = python.parent.parent
+    (venv_dir / ".installed").unlink()
+    mock_subprocess_run.reset_mock()
+
+    waiting_for_lock = threading.Event()
+    flock = fcntl.flock
+
+    def _flock(fd, operation):
+        waiting_for_lock.set()
+        flock(fd, operation)
+
+    monkeypatch.setattr(fcntl, "flock", _flock)
+
+    # another launch holds the build lock and finishes the environment
+    with (venv_dir.parent / f"{venv_dir.name}.lock").open("w") as lock_file:
+        flock(lock_file, fcntl.LOCK_EX)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(prepare_cached_venv, "tinydb\n")
+            assert waiting_for_lock.wait(timeout=5)
+            (venv_dir / ".installed").touch()
+            flock(lock_file, fcntl.LOCK_UN)
+            assert future.result(timeout=5) == python
+
+    mock_subprocess_run.assert_not_called()
+
+
+def test_prepare_cached_venv_without_fcntl(monkeypatch) -> None:
+    monkeypatch.setitem(sys.modules, "fcntl", None)
+    monkeypatch.setattr("launcher.commands.run.subprocess.run", MagicMock())
+
+    python = prepare_cached_venv("tinydb\n")
+
+    assert (python.parent.parent / ".installed").exists()
+
+
+def test_prepare_cached_venv_keyed_by_requirements(monkeypatch) -> None:
+    monkeypatch.setattr("launcher.commands.run.subprocess.run", MagicMock())
+
+    assert prepare_cached_venv("tinydb\n") != prepare_cached_venv("tinydb==4.8.2\n")
+
+
+def test_prepare_notebook_venv_sources(monkeypatch) -> None:
+    mock_prepare = MagicMock()
+    monkeypatch.setattr("launcher.commands.run.prepare_cached_venv", mock_prepare)
+
+    notebook_dir = Path("tests/fixtures/static_deps_reqs_txt")
+    prepare_notebook_venv(
+        notebook_dir, notebook_dir / "notebook.py", Path("requirements.txt")
+    )
+    mock_prepare.assert_called_once_with("marimo\ntinydb\n")
+
+    mock_prepare.reset_mock()
+    assert prepare_notebook_venv(notebook_dir, notebook_dir / "notebook.py", None) is None
+    mock_prepare.assert_not_called()
+
+    notebook_dir = Path("tests/fixtures/inline_deps")
+    prepare_notebook_venv(notebook_dir, notebook_dir / "notebook.py", None)
+    mock_prepare.assert_called_once_with("marimo\ntinydb\n", ">=3.13")